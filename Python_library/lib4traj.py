@@ -4,6 +4,7 @@ Diverse functions to work with Lagrangian trajectories.
 
 from libensdiv import fmean_mb
 import numpy as np
+import xarray as xr
 import cartopy.crs as ccrs
 
 print(f"Name: {__name__}")
@@ -81,4 +82,65 @@ def fdistance(x1,y1,x2,y2):
     This function computes the Euclidean distance between (x1,y1) and (x2,y2).
     x1, y1, x2, and y2 could be a singular position or an array.
     '''''
-    return np.sqrt((x1-x2)**2+(y1-y2)**2)
\ No newline at end of file
+    return np.sqrt((x1-x2)**2+(y1-y2)**2)
+
+def fdispersion_ens(pos,pos_obs=False,dim_mb="mb",dim_xy="xy"):
+    '''''
+    This function computes dispersion statistics of an ensemble of trajectories for all the buoys and time steps at once:
+    the separation between each pair of members, the distance of each member to the ensemble mean and, if given, the distance to the observations.
+    The pairwise separations are obtained from the identity |xi-xj|^2 = |xi|^2 + |xj|^2 - 2 xi.xj applied over the member axis,
+    so there is no loop over the members, the buoys, the time steps or any other dimension of pos.
+    ...
+    Inputs:
+    pos = Cartesian positions (x,y) in km of the simulated buoys (DataArray)
+        it should at least have the dimensions dim_mb and dim_xy, the other dimensions are kept (for example: "exp", "time", "buoy")
+        it could be one of the sublists pos_simubuoys[iperiod] with dims=["exp","mb","time","buoy","xy"]
+    pos_obs = Cartesian positions (x,y) in km of the observed buoys (DataArray), for example pos_IABP[iperiod] with dims=["time","buoy","xy"]
+        if pos_obs=False, the distances to the observations are not computed (default)
+        /!\ pos_obs should be given at the same time steps as pos (for IABP, give pos[:,:,::3,:,:] to have data every 3 hours)
+    dim_mb = name of the member dimension, default="mb"
+    dim_xy = name of the dimension of the Cartesian positions, default="xy"
+    ...
+    Outputs: a Dataset containing
+    mean = position of the ensemble mean (same dimensions as pos except dim_mb)
+    sep_mean = mean separation over all the pairs of members (same dimensions as pos except dim_mb and dim_xy)
+    sep_max = maximal separation over all the pairs of members
+    spread = root mean square distance of the members to the ensemble mean
+    dist_mean = distance of each member to the ensemble mean (same dimensions as pos except dim_xy)
+    if pos_obs is given:
+    dist_obs = distance of each member to the observations (same dimensions as pos except dim_xy)
+    dist_mean_obs = distance of the ensemble mean to the observations (same dimensions as pos except dim_mb and dim_xy)
+    /!\ missing values (NaN) in pos are propagated to all the statistics of the corresponding buoy and time step
+    '''''
+    pos=pos.transpose(...,dim_mb,dim_xy) #the members and the positions become the last two dimensions
+    other_dims=list(pos.dims[:-2]) #dimensions kept in the outputs
+    coords={d:pos.coords[d] for d in other_dims if d in pos.coords}
+    nb_mber=pos.sizes[dim_mb]
+
+    ##Ensemble mean and anomalies
+    X=pos.values
+    mu=X.mean(axis=-2) #position of the ensemble mean
+    Xc=X-mu[...,None,:] #working with the anomalies avoids the loss of precision of the identity for small separations
+
+    ##Distance to the ensemble mean
+    sq=(Xc**2).sum(axis=-1) #squared distance of each member to the ensemble mean
+    
+    ##Pairwise separations
+    gram=np.einsum("...ik,...jk->...ij",Xc,Xc) #scalar products between each pair of members
+    sep2=np.maximum(sq[...,:,None]+sq[...,None,:]-2*gram,0.) #squared separations (rounding errors could make them slightly negative)
+    iu,ju=np.triu_indices(nb_mber,k=1) #each pair of members counted once
+    sep=np.sqrt(sep2[...,iu,ju])
+
+    stats=xr.Dataset(data_vars=dict(mean=(other_dims+[dim_xy],mu),
+                                    sep_mean=(other_dims,sep.mean(axis=-1)),
+                                    sep_max=(other_dims,sep.max(axis=-1)),
+                                    spread=(other_dims,np.sqrt(sq.mean(axis=-1))),
+                                    dist_mean=(other_dims+[dim_mb],np.sqrt(sq))),
+                     coords=coords)
+    
+    ##Distances to the observations (aligned on the names of the dimensions)
+    if pos_obs is not False:
+        stats["dist_obs"]=np.sqrt(((pos-pos_obs)**2).sum(dim_xy)).transpose(*other_dims,dim_mb)
+        stats["dist_mean_obs"]=np.sqrt(((stats["mean"]-pos_obs)**2).sum(dim_xy)).transpose(*other_dims)
+
+    return stats
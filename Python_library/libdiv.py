@@ -9,6 +9,8 @@ print("This is a collection of diverse functions.")
 
 import xarray as xr
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 def fmask_square_domain(size_y,size_x,corners,width,height):
     '''''
@@ -24,4 +26,33 @@ def fmask_square_domain(size_y,size_x,corners,width,height):
     '''''
     mask=xr.DataArray(data=np.zeros((size_y,size_x),dtype=int), dims=["y","x"])#initialization
     mask[corners[1]:corners[1]+height+1,corners[0]:corners[0]+width+1]=1
-    return mask
\ No newline at end of file
+    return mask
+
+def fprefetch(load,items,nb_prefetch=0):
+    '''''
+    This function returns, one after another and in the same order as items, the results of load(item) (generator).
+    If nb_prefetch>0, the next items are loaded in advance by a pool of background threads while the current one is processed,
+    so that the reading of the files (I/O) and the computation overlap.
+    ...
+    The arguments needed are the following:
+    - load = function loading the data of an item, for example: lambda i: data[i][var].compute() to read the variable var of member i
+    - items = list of the items to load, for example the list of the members
+    - nb_prefetch = number of items loaded in advance while the current one is processed (default=0: no prefetching, the items are loaded when they are needed)
+    /!\ while an item is processed, at most nb_prefetch+1 loaded items are kept in memory (the current one and the nb_prefetch next ones);
+    when the next item is requested, the previous one is still held by the caller (e.g. the loop variable) until the next one is returned,
+    so nb_prefetch+2 loaded items could briefly be in memory at the same time
+    '''''
+    if nb_prefetch<=0: #sequential loading
+        for item in items:
+            yield load(item)
+        return
+
+    items=iter(items)
+    with ThreadPoolExecutor(max_workers=nb_prefetch) as pool:
+        pending=deque(pool.submit(load,item) for _,item in zip(range(nb_prefetch),items)) #bounded queue of the items being loaded (at most nb_prefetch, one per thread)
+        while pending:
+            result=pending.popleft().result()
+            for item in items: #loading of the next item (if any) once the queue has room for it
+                pending.append(pool.submit(load,item))
+                break
+            yield result
@@ -9,7 +9,9 @@ print("This is a collection of functions relative to ellipses.")
 
 import numpy as np
 from scipy.stats import chi2
+import matplotlib
 from matplotlib.patches import Ellipse
+from matplotlib.collections import EllipseCollection
 import matplotlib.pyplot as plt
 
 def fit_ellipse(points,proba):
@@ -129,6 +131,71 @@ def draw_ellipse(center,axlength,angle,ax,\
         ax.legend(loc=loc_legend,fontsize=size_legend)
 
 
+def draw_ellipses(center,axlength,angle,ax,text_legend="",\
+                  edge_color="blue",edge_width=1,edge_style="-",fill_color="None",alpha=1,zorder=2,rasterized=False):
+    '''''
+    This function draws all the ellipses whose properties are given as a single artist (EllipseCollection).
+    It is the batch version of draw_ellipse: use it to draw the ellipses of many buoys and/or time steps at once.
+    ...
+    Inputs:
+    center = (x_pos,y_pos) coordinates of the centers of the ellipses
+        shape(center)=(...,2), for example ellipse_carac[iperiod].mu[iexp,:,:,:] with shape (time,buoy,2)
+    axlength = length (total) of the axes of the ellipses
+        shape(axlength)=(...,2), with the same leading dimensions as center
+    angle = angles between each axis of the ellipses and the x-axis
+        shape(angle)=(...,2), with the same leading dimensions as center
+    ax = subfigure on which the ellipses are drawn (for example one of the axes returned by libfig.faxes)
+
+    optional inputs:
+    text_legend = text of the legend of the ellipses; if equal to "" (default), the ellipses do not appear in the legend
+    edge_color = color of the edges of the ellipses; if equal to "None", the edges are not drawn; default="blue"
+    edge_style = style of the line of the edges if drawn, default="-"
+    edge_width = width of the lines of the edges, default=1
+    fill_color = color of the interior of the ellipses; if equal to "None", the interior is not filled; default="None"
+    alpha = the opacity of the ellipses, between 0 and 1: 1 is total opacity, and 0 is no opacity (no ellipse); default=1
+    zorder = order of the ellipses compared to the other elements plotted on the figure, default=2
+    rasterized = boolean equal to True to rasterize the ellipses when the figure is saved in a vector format (pdf, svg...), default=False
+    ...
+    Output:
+    ellipses = the EllipseCollection added to ax
+    /!\ the ellipses with missing (NaN) or default (9999.99) values are not drawn
+    '''''
+    #flattening of all the dimensions except the last one
+    center=np.reshape(np.asarray(center,dtype=float),(-1,2))
+    axlength=np.reshape(np.asarray(axlength,dtype=float),(-1,2))
+    angle=np.reshape(np.asarray(angle,dtype=float),(-1,2))[:,0]
+
+    #removing the ellipses that do not exist
+    valid=np.isfinite(center).all(axis=1)*np.isfinite(axlength).all(axis=1)*np.isfinite(angle)*(axlength<9999).all(axis=1)*(np.abs(center)<9999).all(axis=1)
+    center=center[valid,:] ; axlength=axlength[valid,:] ; angle=angle[valid]
+
+    #plot of the ellipses (the keyword of the transform of the offsets is transOffset before matplotlib 3.6)
+    if tuple(int(v) for v in matplotlib.__version__.split(".")[:2])>=(3,6):
+        transform_offsets=dict(offset_transform=ax.transData)
+    else:
+        transform_offsets=dict(transOffset=ax.transData)
+    ellipses=EllipseCollection(axlength[:,0],axlength[:,1],angle,units="xy",offsets=center,**transform_offsets,\
+                               facecolors=fill_color,edgecolors=edge_color,linestyles=edge_style,linewidths=edge_width,\
+                               alpha=alpha,zorder=zorder,rasterized=rasterized)
+    ax.add_collection(ellipses)
+
+    if len(center)>0:
+        #update of the limits of the subfigure with the bounding boxes of the ellipses
+        theta=np.radians(angle)
+        half_x=0.5*np.sqrt((axlength[:,0]*np.cos(theta))**2+(axlength[:,1]*np.sin(theta))**2)
+        half_y=0.5*np.sqrt((axlength[:,0]*np.sin(theta))**2+(axlength[:,1]*np.cos(theta))**2)
+        half=np.array([half_x,half_y]).T
+        ax.update_datalim(np.concatenate((center-half,center+half)))
+        ax.autoscale_view()
+
+        #legend if asked (an EllipseCollection has no legend handler: an empty ellipse with the same style is added for the legend)
+        if text_legend!="":
+            ax.add_patch(Ellipse(center[0,:],0,0,facecolor=fill_color,edgecolor=edge_color,ls=edge_style,lw=edge_width,\
+                                 alpha=alpha,zorder=zorder,label=text_legend))
+
+    return ellipses
+
+
 def isin_ellipse(points,mu,s,U,proba):
     '''''
     This function returns booleans: True for the points within the ellipse defined by mu, s, U, and proba, and False for the points outside.
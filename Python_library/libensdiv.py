@@ -8,6 +8,8 @@ print(f"Package: {__package__}")
 print("This is a collection of diverse functions for ensemble.")
 
 import numpy as np
+import xarray as xr
+import libdiv
 
 def fspatialmean(data,mask,e1,e2):
     '''''
@@ -25,6 +27,80 @@ def fspatialmean(data,mask,e1,e2):
     mean=(data*mask*e1*e2).sum(("y","x"))/(mask*e1*e2).sum(("y","x"))
     return mean
 
+def fregion_weights(labels,mask,e1,e2):
+    '''''
+    This function precomputes the area weights of several regions, to compute their spatial means with fspatialmean_regions.
+    The weights only depend on the grid and on the regions, so they can be reused for all the variables located at the same point.
+    ...
+    The arguments needed are the following:
+    - labels = a region-label map or a list of region-label maps (2D with the dimensions "y" and "x")
+    in each map, the cells with the label k>0 belong to the region k and the cells with the label 0 do not belong to any region
+    each map is a set of regions: the regions of different maps could overlap (for example a list of domain masks equal to 0 or 1)
+    - mask = the mask to use /!\ should be 2D with the same dimensions as the labels and only contain the 0 or 1 values
+    - e1 and e2 = horizontal mesh sizes
+    /!\ the mask, e1, and e2 should be given at the correct point according to the variable (see maskpt)
+    ...
+    The output is a Dataset containing:
+    - cell, region, weight = for each (cell, region) pair: the position of the cell in the flattened ("y","x") array, the index of the region and the weight (mask*e1*e2)
+    - area = the area of each region (dimension "region"), with the coordinates region_set (index of the map) and label
+    '''''
+    if np.ndim(labels)==2: #only one region-label map
+        labels=[labels]
+    weight2D=np.asarray(mask*e1*e2,dtype=np.float64).flatten()
+
+    cell=[] ; region=[] ; region_set=[] ; label=[]
+    for iset in range(len(labels)): #iteration over the region-label maps
+        lab=np.asarray(labels[iset]).flatten()
+        ids=np.unique(lab[lab>0]) #labels of the regions of this map
+        pos=np.where((lab>0)*(weight2D>0))[0] #cells belonging to a region (cells out of the mask are disregarded)
+        cell.append(pos)
+        region.append(len(label)+np.searchsorted(ids,lab[pos])) #index of the region among all the regions
+        region_set+=[iset]*len(ids) ; label+=list(ids)
+    cell=np.concatenate(cell) ; region=np.concatenate(region)
+    weight=weight2D[cell]
+
+    weights=xr.Dataset(data_vars=dict(cell=(["entry"],cell),region=(["entry"],region),weight=(["entry"],weight),
+                                      area=(["region"],np.bincount(region,weights=weight,minlength=len(label)))),
+                       coords=dict(region_set=(["region"],region_set),label=(["region"],label)))
+    return weights
+
+def fspatialmean_regions(data,weights):
+    '''''
+    This function computes the spatial means (weighted by the area) of a variable over several regions and for all the time steps at once.
+    ...
+    The arguments needed are the following:
+    - data = data of a variable of one member of an experiment (DataArray with at least "x" and "y" as dimensions, for example "time_counter", "y", "x")
+    - weights = the weights of the regions given by fregion_weights (at the correct point according to the variable)
+    ...
+    The output is a Dataset containing the mean, the sum (integral) and the area of each region,
+    with the dimensions of data except "y" and "x", and the dimension "region"
+    /!\ as in fspatialmean, the missing values (NaN) of data are not taken into account in the sum but their cells are counted in the area
+    /!\ the mean of a region without any cell in the mask (area equal to 0) is NaN
+    '''''
+    data=data.transpose(...,"y","x")
+    other_dims=list(data.dims[:-2])
+    size_other=[data.sizes[d] for d in other_dims]
+    nb_region=weights.sizes["region"]
+    
+    values=np.reshape(data.values,(-1,data.sizes["y"]*data.sizes["x"])) #flattened data: (other dimensions, "y"*"x")
+    values=np.where(np.isfinite(values),values,0.) #the missing values are skipped in the sum (as the xarray sum of fspatialmean)
+    nb_field=values.shape[0]
+
+    #one weighted bincount for all the fields and regions
+    idx=np.arange(nb_field)[:,None]*nb_region+weights.region.values[None,:]
+    sums=np.bincount(idx.ravel(),weights=(values[:,weights.cell.values]*weights.weight.values).ravel(),minlength=nb_field*nb_region)
+    sums=np.reshape(sums,size_other+[nb_region])
+
+    coords={d:data.coords[d] for d in other_dims if d in data.coords}
+    coords.update(region_set=weights.region_set,label=weights.label)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        mean=sums/weights.area.values
+    stats=xr.Dataset(data_vars=dict(mean=(other_dims+["region"],mean),
+                                    sum=(other_dims+["region"],sums),
+                                    area=weights.area),
+                     coords=coords)
+    return stats
+
 def maskpt(masktot,maskdomain,pt):
     '''''
     This function gives the mask, e1 and e2 at the right point (Arakawa C-grid)
@@ -98,3 +174,120 @@ def fstd_mb(data,var,nb_member,n):
     ntot=nb_member-(n!=-1)*1.0
     #print(ntot)
     return np.sqrt(isum/(ntot-1))
+
+
+def fflatten_mb(data,var,pos_mask,prefetch=0):
+    '''''
+    This function transforms the 2D fields of all the members and time steps into 1D arrays and keeps only the unmasked cells.
+    Each member is read only once (all the time steps at once).
+    ...
+    The arguments needed are the following:
+    - data = all the members of an experiment; it should be a list of members, with each member as a DataSet
+    /!\ data[i][var] should have 3 dimensions in that order: "time_counter", "y", "x"
+    - var = name of the variable of interest
+    - pos_mask = positions of the unmasked cells in the flattened ("y","x") array (for example np.where(flat_mask>0.)[0])
+    - prefetch = number of members read in advance by background threads while the current member is flattened (default=0: no prefetching)
+    ...
+    The output is a DataArray with the dimensions: "time", "member_ref", "flatyx"
+    '''''
+    size_t=data[0][var].sizes["time_counter"] #time dimension size (all the members have the same size)
+    nb_member=len(data)
+    
+    dat_flatyx=xr.DataArray(data=np.zeros((size_t,nb_member,len(pos_mask)),dtype="float64")+999.999,\
+                            dims=["time","member_ref","flatyx"]) #initialisation
+    
+    fields=libdiv.fprefetch(lambda i: data[i][var].astype(np.float64).values,range(nb_member),prefetch) #reading of the members one after another
+    for imb,field in enumerate(fields): #iteration over the members
+        dat_flatyx[:,imb,:]=np.reshape(field,(size_t,-1))[:,pos_mask] #transformation of 2D arrays into 1D arrays keeping only the unmasked values
+    
+    return dat_flatyx
+
+def fdiag_ens(data,ce=False,weights=False,dim_time="time",dim_mb="member_ref",dim_cell="flatyx",size_chunk=6,seed=0):
+    '''''
+    This function computes ensemble diagnostics for all the cells and time steps at once, each member being taken one after another
+    as the reference and compared to the other members (leave-one-out):
+    - the rank histogram: rank of the reference among the other members (ties are broken randomly)
+    - the spread-skill series: spread (std) of the other members, RMSE of their mean against the reference and their ratio
+    - if ce is given, the reliability curve of the event data>ce: number of cases and of observed events for each forecast probability
+    ...
+    The arguments needed are the following:
+    - data = data of one variable for all the members (DataArray with 3 dimensions: time, member, cell)
+    for example dat_flatyx[ivar] of CRPS_computation.ipynb with dims=["time","member_ref","flatyx"] (only the unmasked cells)
+    - ce = the condition defining the event for the reliability curve; if ce=False the reliability curve is not computed (default)
+    - weights = weights of the cells (1D array with the size of dim_cell, for example e1*e2 of the unmasked cells); if weights=False all the cells have the same weight (default)
+    - dim_time, dim_mb, dim_cell = names of the time, member and cell dimensions, default: "time", "member_ref" and "flatyx"
+    - size_chunk = number of time steps processed together, to control the memory used (default=6)
+    - seed = seed of the random generator used to break the ties of the ranks (default=0)
+    /!\ the cells with a missing value (NaN) for at least one member are not taken into account
+    /!\ at least 3 members are needed
+    ...
+    The output is a Dataset containing:
+    - rank_hist = (weighted) counts of the rank of the reference, dims=[dim_time,dim_mb,"rank"]
+    - spread, rmse = spread of the other members and RMSE of their mean, dims=[dim_time,dim_mb]
+    - ratio = spread-error ratio corrected for the finite ensemble size (equal to 1 for a perfectly reliable ensemble), dims=[dim_time,dim_mb]
+    - reli_nfcst, reli_nobs = (weighted) number of cases and of observed events for each forecast probability, dims=[dim_time,"proba"] (if ce is given)
+    '''''
+    data=data.transpose(dim_time,dim_mb,dim_cell)
+    size_t,nb_member,size_cell=data.shape
+    nb_ens=nb_member-1 #number of members of the ensemble compared to the reference
+    if weights is False:
+        weights=np.ones(size_cell)
+    weights=np.asarray(weights,dtype=np.float64)
+    rng=np.random.default_rng(seed)
+
+    ##Initialisation of the outputs
+    rank_hist=np.zeros((size_t,nb_member,nb_member))
+    spread2=np.zeros((size_t,nb_member)) ; err2=np.zeros((size_t,nb_member)) ; wsum=np.zeros((size_t,1))
+    reli_nfcst=np.zeros((size_t,nb_member)) ; reli_nobs=np.zeros((size_t,nb_member))
+
+    for t0 in range(0,size_t,size_chunk): #iteration over the blocks of time steps (each field is read only once)
+        x=data[t0:t0+size_chunk,:,:].astype(np.float64).values
+        size_tc=x.shape[0]
+        valid=np.isfinite(x).all(axis=1) #cells without missing values
+        w=np.where(valid,weights,0.)[:,None,:] #weights of the cells (0 for the cells not taken into account)
+        x=np.where(valid[:,None,:],x,0.)
+        wsum[t0:t0+size_tc,0]=w.sum(axis=(1,2))
+        w=np.broadcast_to(w,x.shape)
+        
+        ##Rank histogram
+        #the rank of each member among all the members is its rank among the other members (ties broken with a random secondary key)
+        order=np.lexsort((rng.random(x.shape),x),axis=1)
+        rank=np.empty_like(order)
+        np.put_along_axis(rank,order,np.broadcast_to(np.arange(nb_member)[None,:,None],order.shape),axis=1)
+        idx=(np.arange(size_tc)[:,None,None]*nb_member+np.arange(nb_member)[None,:,None])*nb_member+rank #index of (time, reference, rank)
+        rank_hist[t0:t0+size_tc]=np.bincount(idx.ravel(),weights=w.ravel(),minlength=size_tc*nb_member**2).reshape(size_tc,nb_member,nb_member)
+        
+        ##Spread-skill
+        #leave-one-out mean and variance deduced from the sums over all members (anomalies used to avoid the loss of precision)
+        xc=x-x.mean(axis=1,keepdims=True)
+        sum1=xc.sum(axis=1,keepdims=True) ; sum2=(xc**2).sum(axis=1,keepdims=True)
+        mean_loo=(sum1-xc)/nb_ens
+        var_loo=np.maximum((sum2-xc**2-nb_ens*mean_loo**2)/(nb_ens-1),0.)
+        spread2[t0:t0+size_tc]=(var_loo*w).sum(axis=2)
+        err2[t0:t0+size_tc]=((xc-mean_loo)**2*w).sum(axis=2)
+
+        ##Reliability
+        if ce is not False:
+            event=x>ce
+            nb_fcst=event.sum(axis=1,keepdims=True)-event #number of members forecasting the event without the reference
+            idx=np.arange(size_tc)[:,None,None]*nb_member+nb_fcst #index of (time, forecast probability)
+            reli_nfcst[t0:t0+size_tc]=np.bincount(idx.ravel(),weights=w.ravel(),minlength=size_tc*nb_member).reshape(size_tc,nb_member)
+            reli_nobs[t0:t0+size_tc]=np.bincount(idx.ravel(),weights=(w*event).ravel(),minlength=size_tc*nb_member).reshape(size_tc,nb_member)
+
+    ##Saving of the outputs
+    spread=np.sqrt(spread2/wsum) ; rmse=np.sqrt(err2/wsum)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        ratio=np.sqrt((nb_ens+1)/nb_ens)*spread/rmse
+
+    coords={d:data.coords[d] for d in (dim_time,dim_mb) if d in data.coords}
+    coords["rank"]=np.arange(nb_member)
+    diag=xr.Dataset(data_vars=dict(rank_hist=([dim_time,dim_mb,"rank"],rank_hist),
+                                   spread=([dim_time,dim_mb],spread),
+                                   rmse=([dim_time,dim_mb],rmse),
+                                   ratio=([dim_time,dim_mb],ratio)),
+                    coords=coords)
+    if ce is not False:
+        diag["reli_nfcst"]=xr.DataArray(reli_nfcst,dims=[dim_time,"proba"],coords={"proba":np.arange(nb_member)/nb_ens})
+        diag["reli_nobs"]=xr.DataArray(reli_nobs,dims=[dim_time,"proba"],coords={"proba":np.arange(nb_member)/nb_ens})
+    
+    return diag
@@ -10,6 +10,7 @@ print("This is a collection of diverse functions for creating figures.")
 import matplotlib.gridspec as gridspec
 import matplotlib.pyplot as plt
 from matplotlib.patches import Ellipse
+from matplotlib.collections import LineCollection
 import matplotlib.transforms as transforms
 import numpy as np
 
@@ -60,6 +61,36 @@ def faxes(nsubfig,ncol,nrow,srow=-1):
                     axs.append(axs_tmp[pos_axs_tmp[irow,icol]])
     return axs
 
+def draw_trajectories(pos,ax,axis_time=-3,color="blue",lw=1,ls="-",alpha=1,zorder=1,label="",end_point=False,rasterized=False):
+    '''''
+    This function draws all the trajectories given as a single artist (LineCollection) instead of one ax.plot per trajectory.
+    ...
+    pos = Cartesian positions (x,y) of the trajectories (array or DataArray) with the positions as the last dimension
+        for example pos_simubuoys[iperiod][iexp,:,:,:,:] with shape (mb,time,buoy,2) draws all the members and buoys of an experiment (axis_time=-3)
+        and pos_simubuoys[iperiod][iexp,:,:,ib,:] with shape (mb,time,2) draws all the members for the buoy ib (axis_time=-2)
+    ax = subfigure on which the trajectories are drawn (for example one of the axes returned by faxes)
+    axis_time = position of the time dimension in pos, default=-3 (layout of pos_simubuoys: ...,"time","buoy","xy")
+    color, lw, ls, alpha = color, width, style and opacity of the lines, default: "blue", 1, "-" and 1
+    zorder = order of the trajectories compared to the other elements plotted on the figure, default=1
+    label = label of the trajectories in the legend (only once for all the trajectories), default="" (no legend)
+    end_point = boolean equal to True to also plot a point at the end of each trajectory (in one ax.scatter call), default=False
+    rasterized = boolean equal to True to rasterize the trajectories when the figure is saved in a vector format (pdf, svg...), default=False
+    /!\ missing (NaN) or default (99999.99) positions are not drawn
+    '''''
+    pos=np.moveaxis(np.asarray(pos,dtype=float),axis_time,-2) #time becomes the second to last dimension
+    segments=np.reshape(pos,(-1,)+np.shape(pos)[-2:]) #one line per trajectory: shape (nb_traj,time,2)
+    segments=np.where(np.abs(segments)<99999,segments,np.nan) #masking the default values
+    
+    lines=LineCollection(segments,colors=color,linewidths=lw,linestyles=ls,alpha=alpha,zorder=zorder,\
+                         label=label,rasterized=rasterized)
+    ax.add_collection(lines) #the limits of the subfigure are updated with the trajectories
+    ax.autoscale_view()
+
+    if end_point: #plot of the last position of each trajectory
+        ax.scatter(segments[:,-1,0],segments[:,-1,1],color=color,alpha=alpha,zorder=zorder,rasterized=rasterized)
+
+    return lines
+
 def fgraph_attributesv2(exp_name,type_color,type_label="full",focus_model="both"):
     '''''
     This function returns the color and label associated with this experiment according to our choices.
@@ -35,7 +35,7 @@ def fmask_ce(data,ce):
     mask=mask.where(data.values>ce,0) #the mask is equal to 0 where data<=ce
     return mask
 
-def fproba_ce(data,var,ce,n=-1):
+def fproba_ce(data,var,ce,n=-1,prefetch=0):
     '''''
     This function computes the frequency over all the members (except one if n!=-1) of the event data>ce.
     ...
@@ -45,6 +45,7 @@ def fproba_ce(data,var,ce,n=-1):
     - var = name of the variable of interest 
     - ce = the condition
     - n = the member to exclude; if you don't want to exclude any member put n=-1
+    - prefetch = number of members read in advance by background threads while the current member is processed (default=0: no prefetching)
     By default it computes the frequency over all members.
     '''''
     size_y=data[0].sizes["y"] ; size_x=data[0].sizes["x"] #horizontal dimension sizes (all the members have the same sizes)
@@ -54,16 +55,16 @@ def fproba_ce(data,var,ce,n=-1):
 
     nb_member=len(data) #number of members of data
     
-    for i in range(nb_member): #for all members
-        if i!=n: #except n
-            mask=fmask_ce(data[i][var],ce) #computation of a mask equal to 1 where data[i][var]>ce and 0 elsewhere
-            proba+=mask
+    members=[i for i in range(nb_member) if i!=n] #all members except n
+    for field in libdiv.fprefetch(lambda i: data[i][var].compute(),members,prefetch): #reading of the members one after another
+        mask=fmask_ce(field,ce) #computation of a mask equal to 1 where data[i][var]>ce and 0 elsewhere
+        proba+=mask
     if n==-1:
         return proba/nb_member #return a probability (frequency) array of having the value of var strictly superior to ce, taking into account all members
     else:
         return proba/(nb_member-1) #return a probability (frequency) array of having the value of var strictly superior to ce, without taking into account member n
 
-def fSPS_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,height=False):
+def fSPS_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,height=False,prefetch=0):
     '''''
     This function computes the SPS for the ice edge. 
     If specified, the SPS is computed over the domain defined with the indexes:
@@ -74,6 +75,7 @@ def fSPS_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heig
     - masked_field: the reference is a 2D (or 3D if there is a time dimension) field with values only between 0 and 1.
     /!\ the reference given should use the same ce criterion to define the ice edge
     This last type of reference could be processed observations, a probability map of another ensemble, etc.
+    Observations on another grid can first be remapped onto the NANUK4 grid with libregrid (fremap_matrix and fremap_apply).
     ...
     The arguments needed are the following:
     - data = data of the experiment of which we want to compute the score
@@ -89,6 +91,7 @@ def fSPS_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heig
     If corners=False computation over all the domain (default).
     - width = length of the domain in the x-direction (default=False)
     - height = length of the domain in the y-direction (default=False)
+    - prefetch = number of members read in advance by background threads while the current member is processed (default=0: no prefetching)
     /!\ This function is designed to work with NEMO outputs!
     '''''
     #saving the sizes of the dimensions "x" and "y" of data
@@ -108,22 +111,23 @@ def fSPS_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heig
         nb_member=len(data) #number of members of data
         for n in range(nb_member): #iteration over the members of data
             SPS_id[1].append("ref mber: "+str(n+1))
-            proba=fproba_ce(data,var,ce,n)*mask_domain #compute the probability (frequency) array of having the value of var strictly superior to ce, without taking into account member n
+            proba=fproba_ce(data,var,ce,n,prefetch)*mask_domain #compute the probability (frequency) array of having the value of var strictly superior to ce, without taking into account member n
             proba_ref=fmask_ce(data[n][var],ce)*mask_domain #compute the reference probability (member n as reference) equal to 1 where data[n][var]>ce and 0 elsewhere
             print(np.shape(proba),np.shape(proba_ref),np.shape(e1),np.shape(e2))
             SPS.append((((proba-proba_ref)**2)*e1*e2).sum(("y","x"))) #computing of the SPS
     
     elif type_ref=="other_ens": #members of data_ref are taken one after another as the reference
         nb_member_ref=len(data_ref) #number of members of data_ref
-        proba=fproba_ce(data,var,ce)*mask_domain #compute the probability (frequency) array of having the value of var strictly superior to ce for data
-        for n in range(nb_member_ref):#iteration over the members of data_ref
+        proba=fproba_ce(data,var,ce,prefetch=prefetch)*mask_domain #compute the probability (frequency) array of having the value of var strictly superior to ce for data
+        fields_ref=libdiv.fprefetch(lambda i: data_ref[i][var].compute(),range(nb_member_ref),prefetch) #reading of the members of data_ref one after another
+        for n,field_ref in enumerate(fields_ref):#iteration over the members of data_ref
             SPS_id[1].append("ref mber: "+str(n+1))
-            proba_ref=fmask_ce(data_ref[n][var],ce)*mask_domain #compute the reference probability (member n of data_ref as reference) equal to 1 where data_ref[n][var]>ce and 0 elsewhere
+            proba_ref=fmask_ce(field_ref,ce)*mask_domain #compute the reference probability (member n of data_ref as reference) equal to 1 where data_ref[n][var]>ce and 0 elsewhere
             print(np.shape(proba),np.shape(proba_ref),np.shape(e1),np.shape(e2))
             SPS.append((((proba-proba_ref)**2)*e1*e2).sum(("y","x"))) #computing of the SPS
     
     elif type_ref=="masked_field": #data_ref is taken as the reference
-        proba=fproba_ce(data,var,ce)*mask_domain #compute the probability (frequency) array of having the value of var strictly superior to ce for data
+        proba=fproba_ce(data,var,ce,prefetch=prefetch)*mask_domain #compute the probability (frequency) array of having the value of var strictly superior to ce for data
         proba_ref=data_ref*mask_domain
         print(np.shape(proba),np.shape(proba_ref),np.shape(e1),np.shape(e2))
         SPS.append((((proba-proba_ref)**2)*e1*e2).sum(("y","x"))) #computing of the SPS
@@ -133,7 +137,7 @@ def fSPS_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heig
     
     return (SPS,SPS_id)
 
-def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,height=False):
+def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,height=False,prefetch=0):
     '''''
     This function computes the components O and U of the IIEE for the ensemble-median ice edge.
     If specified, the components O and U are computed over the domain defined with the indexes:
@@ -144,6 +148,7 @@ def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heigh
     - masked_field: the reference is a 2D (or 3D if there is a time dimension) field with values only between 0 and 1.
     /!\ the reference given should use the same ce criterion to define the ice edge
     This last type of reference could be processed observations, a probability map of another ensemble, etc.
+    Observations on another grid can first be remapped onto the NANUK4 grid with libregrid (fremap_matrix and fremap_apply).
     ...
     The arguments needed are the following:
     - data = data of the experiment of which we want to compute the score
@@ -159,6 +164,7 @@ def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heigh
     If corners=False computation over all the domain (default).
     - width = length of the domain in the x-direction (default=False)
     - height = length of the domain in the y-direction (default=False)
+    - prefetch = number of members read in advance by background threads while the current member is processed (default=0: no prefetching)
     /!\ This function is designed to work with NEMO outputs!
     '''''
     #saving the sizes of the dimensions "x" and "y" of data
@@ -180,7 +186,7 @@ def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heigh
             OU_id[1].append("ref mber: "+str(n+1))
 
             #computation of a mask equal to 1 where the probability to have the value of var strictly superior to ce is strictly superior to 0.5
-            proba=fproba_ce(data,var,ce,n) #computation of probability map of having the value of var strictly superior to ce
+            proba=fproba_ce(data,var,ce,n,prefetch) #computation of probability map of having the value of var strictly superior to ce
     
             mask_iemed=fmask_ce(proba,0.5)*mask_domain #computation of a mask equal to 1 where proba > 0.5 and 0 elsewhere
 
@@ -201,15 +207,16 @@ def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heigh
         nb_member_ref=len(data_ref) #number of members of data_ref
         
         #computation of a mask equal to 1 where the probability to have the value of var strictly superior to ce is strictly superior to 0.5
-        proba=fproba_ce(data,var,ce) #computation of probability map of having the value of var strictly superior to ce
+        proba=fproba_ce(data,var,ce,prefetch=prefetch) #computation of probability map of having the value of var strictly superior to ce
     
         mask_iemed=fmask_ce(proba,0.5)*mask_domain #computation of a mask equal to where proba > 0.5 and 0 elsewhere
         
-        for n in range(nb_member_ref):#iteration over all members of data_ref
+        fields_ref=libdiv.fprefetch(lambda i: data_ref[i][var].compute(),range(nb_member_ref),prefetch) #reading of the members of data_ref one after another
+        for n,field_ref in enumerate(fields_ref):#iteration over all members of data_ref
             OU_id[1].append("ref mber: "+str(n+1))
 
             #computation of a mask equal to 1 where data_ref[n][var] > ce and 0 elsewhere with n the reference member
-            mask_ref=fmask_ce(data_ref[n][var],ce)*mask_domain
+            mask_ref=fmask_ce(field_ref,ce)*mask_domain
 
             #computing O component
             Otmp=np.maximum(mask_iemed-mask_ref,0.)
@@ -223,7 +230,7 @@ def fOU_IIEE(data,type_ref,data_ref,var,ce,e1,e2,corners=False,width=False,heigh
             
     elif type_ref=="masked_field": #data_ref is taken as the reference
         #computation of a mask equal to 1 where the probability to have the value of var strictly superior to ce is strictly superior to 0.5
-        proba=fproba_ce(data,var,ce) #computation of probability map of having the value of var strictly superior to ce
+        proba=fproba_ce(data,var,ce,prefetch=prefetch) #computation of probability map of having the value of var strictly superior to ce
     
         mask_iemed=fmask_ce(proba,0.5)*mask_domain #computation of a mask equal to where proba > 0.5 and 0 elsewhere
 
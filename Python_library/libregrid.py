@@ -0,0 +1,139 @@
+"""
+Functions to remap fields (e.g. observations) onto the NANUK4 grid.
+"""
+
+print(f"Name: {__name__}")
+print(f"Package: {__package__}")
+
+print("This is a collection of functions to remap fields onto the NANUK4 grid.")
+
+import os
+import hashlib
+import numpy as np
+import xarray as xr
+import scipy.sparse as sparse
+from scipy.spatial import cKDTree
+import lib4traj
+
+def fremap_matrix(lat_obs,lon_obs,masktot,mask=False,method="nearest",nsub=5,max_dist=False,path_cache=False):
+    '''''
+    This function computes the sparse matrix remapping a field from an observation grid onto the T-points of the NANUK4 grid.
+    The positions are compared in Cartesian coordinates (km) given by lib4traj.projGeo2Cartesian. Two methods are possible:
+    - nearest: each T-cell takes the value of the nearest observation point
+    - conservative: each T-cell is divided into nsub x nsub sub-cells using e1t and e2t along the local directions of the grid,
+    each sub-cell takes the value of the nearest observation point and the T-cell value is the mean over its sub-cells
+    (first-order conservative remapping approximated by the fraction of the area of the T-cell covered by each observation cell)
+    If path_cache is given, the matrix is saved in this file with the parameters used to compute it (method, nsub, max_dist
+    and a hash of the mask and of the coordinates and mesh sizes), and read from it the next time if these parameters are the same.
+    ...
+    The arguments needed are the following:
+    - lat_obs, lon_obs = latitude and longitude (in degrees) of the observation points, 2D arrays (for a regular grid, use np.meshgrid)
+    - masktot = dataset of the NANUK4 mesh_mask containing glamt, gphit, e1t and e2t, with 3 dimensions: "time" (or equivalent), "y", and "x"
+    - mask = mask of the T-cells on which the field is remapped (2D with the dimensions "y" and "x", only 0 or 1); if mask=False all the T-cells (default)
+    - method = "nearest" (default) or "conservative"
+    - nsub = number of sub-cells in each direction for the conservative method (default=5)
+    - max_dist = maximal distance (km) to the nearest observation point, farther points are not used;
+    if max_dist=False, it is equal to the typical distance between two neighbouring observation points (default)
+    - path_cache = path of the file where the matrix is saved (".npz" is added if needed); if path_cache=False, the matrix is not saved (default)
+    ...
+    The output is a sparse matrix of shape (size_y*size_x, number of observation points) to give to fremap_apply
+    '''''
+    lat_t=masktot.gphit[0,:,:] ; lon_t=masktot.glamt[0,:,:]
+    size_y=lat_t.sizes["y"] ; size_x=lat_t.sizes["x"]
+    nb_obs=np.size(lat_obs)
+
+    #identifier of the parameters used to compute the matrix
+    key=hashlib.sha1((method+" "+str(nsub)+" "+str(max_dist)+" "+str(np.shape(lat_obs))+" "+str((size_y,size_x))).encode())
+    for field in (lat_obs,lon_obs,lat_t,lon_t,masktot.e1t[0,:,:],masktot.e2t[0,:,:],mask):
+        key.update(np.ascontiguousarray(field,dtype=np.float64).tobytes())
+    key=key.hexdigest()
+
+    #reading of the matrix if it has already been computed with the same parameters
+    if path_cache:
+        if not path_cache.endswith(".npz"):
+            path_cache+=".npz"
+        if os.path.exists(path_cache):
+            with np.load(path_cache) as cache:
+                if "key" in cache and str(cache["key"])==key:
+                    print("remapping matrix read from "+path_cache)
+                    return sparse.csr_matrix((cache["data"],cache["indices"],cache["indptr"]),shape=tuple(cache["shape"]))
+            print("the remapping matrix saved in "+path_cache+" was computed with other parameters, it is computed again")
+
+    #Cartesian positions of the observation points and of the T-points
+    pos_obs=lib4traj.projGeo2Cartesian(np.asarray(lat_obs,dtype=np.float64).flatten(),np.asarray(lon_obs,dtype=np.float64).flatten())
+    pos_t=lib4traj.projGeo2Cartesian(lat_t.values.flatten(),lon_t.values.flatten())
+    tree=cKDTree(pos_obs)
+    if max_dist is False: #typical distance between two neighbouring observation points
+        max_dist=np.median(tree.query(pos_obs,k=2)[0][:,1])
+
+    #T-cells on which the field is remapped
+    if mask is False:
+        cells=np.arange(size_y*size_x)
+    else:
+        cells=np.where(np.asarray(mask).flatten()>0)[0]
+
+    if method=="nearest":
+        points=pos_t[cells,:]
+        rows=cells
+        frac=1.
+
+    elif method=="conservative":
+        #unit vectors along the local directions "x" and "y" of the grid
+        X=np.reshape(pos_t[:,0],(size_y,size_x)) ; Y=np.reshape(pos_t[:,1],(size_y,size_x))
+        dXdy,dXdx=np.gradient(X) ; dYdy,dYdx=np.gradient(Y)
+        ux=np.array([dXdx,dYdx]) ; ux=np.reshape(ux/np.sqrt((ux**2).sum(axis=0)),(2,-1))[:,cells]
+        uy=np.array([dXdy,dYdy]) ; uy=np.reshape(uy/np.sqrt((uy**2).sum(axis=0)),(2,-1))[:,cells]
+        e1=masktot.e1t[0,:,:].values.flatten()[cells]/1000. ; e2=masktot.e2t[0,:,:].values.flatten()[cells]/1000. #mesh sizes in km
+
+        #centres of the sub-cells: shape (number of T-cells, nsub*nsub, 2)
+        frac_sub=(np.arange(nsub)+0.5)/nsub-0.5
+        a,b=np.meshgrid(frac_sub,frac_sub) ; a=a.flatten() ; b=b.flatten()
+        points=pos_t[cells,None,:]+(a[None,:]*e1[:,None])[:,:,None]*ux.T[:,None,:]+(b[None,:]*e2[:,None])[:,:,None]*uy.T[:,None,:]
+        points=np.reshape(points,(-1,2))
+        rows=np.repeat(cells,nsub*nsub)
+        frac=1./(nsub*nsub) #fraction of the area of the T-cell of each sub-cell
+
+    else:
+        print("This method is not possible: nearest or conservative")
+        return ()
+
+    #nearest observation point
+    dist,cols=tree.query(points,distance_upper_bound=max_dist)
+    valid=np.isfinite(dist) #points without observation point closer than max_dist
+    remap=sparse.csr_matrix((np.zeros(valid.sum())+frac,(rows[valid],cols[valid])),shape=(size_y*size_x,nb_obs)) #the weights of the same (T-cell, observation) are summed
+
+    if path_cache:
+        np.savez(path_cache,data=remap.data,indices=remap.indices,indptr=remap.indptr,shape=remap.shape,key=key)
+        print("remapping matrix saved in "+path_cache)
+    return remap
+
+def fremap_apply(remap,data_obs,size_y,size_x,dim_time="time"):
+    '''''
+    This function remaps a field (or a time series of fields) onto the NANUK4 grid with the matrix given by fremap_matrix.
+    The missing values (NaN) of the observations are not taken into account: the weights of the other observation points are normalised.
+    ...
+    The arguments needed are the following:
+    - remap = the remapping matrix given by fremap_matrix
+    - data_obs = the field on the observation grid (DataArray), with the same (2D) grid as lat_obs and lon_obs and possibly a time dimension
+    - size_y, size_x = sizes of the dimensions "y" and "x" of the NANUK4 grid
+    - dim_time = name of the time dimension of data_obs (default="time"); it is renamed "time_counter" as in the NEMO outputs
+    ...
+    The output is a DataArray with the dimensions ("time_counter",) "y", "x", equal to NaN on the T-cells without observation.
+    It could be given (after fmask_ce if needed) as data_ref to fSPS_IIEE or fOU_IIEE with type_ref="masked_field".
+    '''''
+    if dim_time in data_obs.dims: #time series
+        values=np.reshape(data_obs.transpose(dim_time,...).values,(data_obs.sizes[dim_time],-1))
+    else: #only one field
+        values=np.reshape(data_obs.values,(1,-1))
+
+    remapped=np.zeros((values.shape[0],size_y*size_x))
+    for t in range(values.shape[0]): #iteration over time: one sparse matrix product per time step
+        valid=np.isfinite(values[t,:])
+        tmp=remap@np.array([np.where(valid,values[t,:],0.),valid]).T #remapped field and sum of the weights of the valid observations
+        with np.errstate(divide="ignore",invalid="ignore"):
+            remapped[t,:]=np.where(tmp[:,1]>0,tmp[:,0]/tmp[:,1],np.nan)
+
+    if dim_time in data_obs.dims:
+        return xr.DataArray(data=np.reshape(remapped,(-1,size_y,size_x)),dims=["time_counter","y","x"])
+    else:
+        return xr.DataArray(data=np.reshape(remapped,(size_y,size_x)),dims=["y","x"])